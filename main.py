@@ -1,13 +1,14 @@
 import argparse
 import os
 import sys
-from model import unwxapkg, config, info_finder
+from model import unwxapkg, config, info_finder, active_request, base_vuln
 
 EXAMPLE_USAGE = """
 示例:
   扫描一个已解包的文件夹: python main.py --mode sf --folder-path .\\app_code\\demo --config-file config\\config.yaml
   直接解包并扫描 wxapkg:   python main.py --mode sp --folder-path \"D:\\\\WeChat Files\\\\Applet\\\\wx123...\" --config-file config\\config.yaml
   持续监控默认目录:         python main.py --mode mf --config-file config\\config.yaml
+  审核待定域名并补充验活:   python main.py --mode rv --config-file config\\config.yaml
 """
 
 
@@ -29,15 +30,17 @@ if __name__ == '__main__':
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
 
-    parser.add_argument("--mode", required=True, choices=["sp", "sf", "mf"], help="选择启动模式：sp 解包+扫描; sf 扫描已有代码目录; mf 监控小程序更新包目录。")
+    parser.add_argument("--mode", required=True, choices=["sp", "sf", "mf", "rv"], help="选择启动模式：sp 解包+扫描; sf 扫描已有代码目录; mf 监控小程序更新包目录; rv 审核待定域名并补充验活。")
     parser.add_argument("--config-file", default=r'./config/config.yaml', help="指定配置文件路径 (默认 ./config/config.yaml)")
     parser.add_argument("--wxid", help="微信小程序的 AES secret key（如果需要解密）")
     parser.add_argument("--folder-path", help="指定的包或文件夹路径（sp/sf 模式必填）")
+    parser.add_argument("--refresh", action="store_true", help="忽略验活结果缓存，重新发送所有请求")
 
     args = parser.parse_args()
 
     config_path = ensure_path_exists(args.config_file, "配置文件")
     all_config = config.load_config(config_yaml_path=config_path)
+    all_config['Request_Config']['refresh'] = args.refresh
 
     if args.mode in ('sp', 'sf') and not args.folder_path:
         fail("请用 --folder-path 指定文件或文件夹。示例: --folder-path D:\\WeChat Files\\Applet\\wx1234567890")
@@ -49,7 +52,9 @@ if __name__ == '__main__':
         Applet_Packet_Save_Folder = unwxapkg.unpacket(mon_folder, son_folder, all_config['File_Config'])
         info_finder.run_info_finder(Applet_Packet_Save_Folder, all_config)
     elif args.mode == 'mf':
-        unwxapkg.monitor_folder(all_config)
+        unwxapkg.monitor_folder(all_config, config_path)
     elif args.mode == 'sf':
         target_path = ensure_path_exists(args.folder_path, "待扫描的文件夹")
         info_finder.run_info_finder(target_path, all_config)
+    elif args.mode == 'rv':
+        active_request.review_pending(all_config['Request_Config'], base_vuln.build_vuln_probe(all_config))
@@ -2,6 +2,7 @@
 api接口未授权扫描以及非 200 状态码绕过。
 
 """
+import hashlib
 import queue
 import re
 import requests
@@ -10,14 +11,34 @@ import socket
 import threading
 import urllib3
 
+from model.domain_review import DomainDecisionStore, extract_hostname, get_decision_store, registrable_domain
+from model.verify_cache import get_verify_cache
 
-def req_work(task_queue, results_queue, Request_Config=None):
+
+def req_work(task_queue, results_queue, Request_Config=None, catch_all=None, verify_cache=None):
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    max_body_size = int(Request_Config.get('max_body_size', 512) or 0) * 1024
     # 定义一个线程执行的任务函数
     while True:
         try:
             url = task_queue.get(block=False)
-            for http_method in Request_Config['http_methods']:
+            host = extract_domain_port(url)
+            for i, http_method in enumerate(Request_Config['http_methods']):
+                # 泛解析/兜底页面的主机直接跳过，节省请求；整条 url 被跳过时归入兜底页面的分组，便于在结果中看到
+                catch_all_page = catch_all.catch_all_page(host) if catch_all is not None else None
+                if catch_all_page is not None:
+                    if i == 0:
+                        results_queue.put([catch_all_page[0], 'CATCH-ALL', 0, url, catch_all_page[1]])
+                    break
+                # 命中未过期的验活缓存则不再发包
+                cached = verify_cache.get(http_method, url) if verify_cache is not None else None
+                if cached is not None:
+                    status_code, body_kb, fingerprint = cached
+                    if catch_all is not None:
+                        catch_all.record(host, url, status_code, fingerprint)
+                    print(f"[{status_code}] [{http_method}] {body_kb}KB {url} (cache)")
+                    results_queue.put([status_code, http_method, body_kb, url, fingerprint])
+                    continue
                 try:
                     response = requests.request(method=http_method,
                                                 url=url,
@@ -29,14 +50,25 @@ def req_work(task_queue, results_queue, Request_Config=None):
                                                 allow_redirects=Request_Config['allow_redirects'],
                                                 verify=Request_Config['verify'],
                                                 timeout=Request_Config['timeout'],
-                                                proxies=Request_Config['proxies']
+                                                proxies=Request_Config['proxies'],
+                                                stream=True
                                                 )
-                    print(f"[{response.status_code}] [{http_method}] {len(response.text.encode('utf-8')) / 1024}KB {url}")
+                    try:
+                        body, body_size = read_body(response, max_body_size)
+                    finally:
+                        response.close()
+                    fingerprint = hashlib.md5(body).hexdigest()
+                    if catch_all is not None:
+                        catch_all.record(host, url, response.status_code, fingerprint)
+                    if verify_cache is not None:
+                        verify_cache.put(http_method, url, response.status_code, body_size / 1024, fingerprint)
+                    print(f"[{response.status_code}] [{http_method}] {body_size / 1024}KB {url}")
                     result = [
                         response.status_code,
                         http_method,
-                        len(response.text.encode('utf-8')) / 1024,
-                        url
+                        body_size / 1024,
+                        url,
+                        fingerprint
                     ]
                     # 将处理结果存储到 results 队列中
                     results_queue.put(result)
@@ -54,12 +86,94 @@ def req_work(task_queue, results_queue, Request_Config=None):
             task_queue.task_done()
 
 
+def read_body(response, max_body_size=0):
+    """
+    流式读取响应体，最多读取 max_body_size 字节（0 表示不限制）。
+    :return: (读取到的 body, 响应大小)，截断时大小优先取 Content-Length
+    """
+    chunks = []
+    read_size = 0
+    truncated = False
+    for chunk in response.iter_content(chunk_size=8192):
+        if not chunk:
+            continue
+        if max_body_size and read_size + len(chunk) > max_body_size:
+            chunks.append(chunk[:max_body_size - read_size])
+            read_size = max_body_size
+            truncated = True
+            break
+        chunks.append(chunk)
+        read_size += len(chunk)
+    body_size = read_size
+    if truncated:
+        try:
+            body_size = max(int(response.headers.get('Content-Length', 0)), read_size)
+        except ValueError:
+            pass
+    return b''.join(chunks), body_size
+
+
+class CatchAllTracker:
+    """
+    按主机记录连续返回相同 2xx 页面（状态码 + 响应指纹）的不同 url 数，达到阈值即判定为泛解析/兜底页面（catch-all）。
+    同一 url 的多种请求方式只计一次；401/404 等非 2xx 响应在正常 API 主机上本来就大量相同，不参与判定，只打断连续计数。
+    """
+
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        # {host: [(status_code, fingerprint), {url, ...}]}
+        self.streaks = {}
+        # {host: (status_code, fingerprint)}
+        self.catch_all_hosts = {}
+
+    def record(self, host, url, status_code, fingerprint):
+        if not self.threshold:
+            return
+        with self.lock:
+            if not 200 <= status_code < 300:
+                self.streaks.pop(host, None)
+                return
+            key = (status_code, fingerprint)
+            streak = self.streaks.get(host)
+            if streak is None or streak[0] != key:
+                streak = self.streaks[host] = [key, set()]
+            streak[1].add(url)
+            if len(streak[1]) >= self.threshold and host not in self.catch_all_hosts:
+                self.catch_all_hosts[host] = key
+                print(f"[catch-all] {host[0]}:{host[1]} 连续 {len(streak[1])} 个 url 返回相同页面 {fingerprint}，跳过后续请求")
+
+    def catch_all_page(self, host):
+        """
+        :return: 判定为兜底页面的 (status_code, fingerprint)，未判定返回 None
+        """
+        with self.lock:
+            return self.catch_all_hosts.get(host)
+
+
+def group_by_fingerprint(results_queue):
+    """
+    按 (状态码, 响应指纹) 对验活结果分组，相同页面只需人工查看一次。
+    因兜底页面被跳过的 url 以请求方式 CATCH-ALL 归入对应页面的分组。
+    :return: {(status_code, fingerprint): [[status_code, http_method, body_kb, url, fingerprint], ...]}
+    """
+    groups = {}
+    while not results_queue.empty():
+        result = results_queue.get(block=False)
+        groups.setdefault((result[0], result[4]), []).append(result)
+    return groups
+
+
 # def print_out(result=None, Request_Config=None):
 #     status_code, http_method, resp_len, url = result
 #     if status_code
 
 
-def scan_active(url_list=None, uri_list=None, Request_Config=None):
+def scan_active(url_list=None, uri_list=None, Request_Config=None, alive_cache=None, vuln_probe=None, verify=True):
+    """
+    :param vuln_probe: spring/swagger 探测函数 vuln_probe(url_list, alive_cache)，对之前延后审核、现已批准的目标补做探测
+    :param verify: False 时只做域名筛选和补做探测，不验活（未开启 request_active 但开启了 vulscan_active）
+    """
     if url_list is None:
         url_list = []
     # 先用黑白名单筛选一波url和uri
@@ -67,34 +181,99 @@ def scan_active(url_list=None, uri_list=None, Request_Config=None):
     url_list = filter_list(url_list, Request_Config['ip_filter_rule'])
     uri_list = filter_list(uri_list, Request_Config['uri_filter_rule'])
 
-    # 然后手动筛选一遍domain
-    if Request_Config['manual_filter']:
-        url_list = manual_filter(url_list)
+    # 然后手动筛选一遍domain，审核结果持久化保存
+    if not Request_Config['manual_filter']:
+        return scan_targets([(url_list, uri_list)], Request_Config, alive_cache) if verify else {}
+
+    decision_store = get_decision_store(Request_Config.get('domain_decision_file', 'cache/domain_decisions.json'))
+    if Request_Config.get('manual_filter_mode', 'defer') == 'interactive':
+        url_list = manual_filter(url_list, decision_store)
+    else:
+        url_list = defer_filter(url_list, uri_list, decision_store)
+    # 之前延后审核、现已批准的目标在本轮一并验活
+    return scan_decided(decision_store, [(url_list, uri_list)] if verify else [], Request_Config, alive_cache,
+                        vuln_probe=vuln_probe, verify=verify)
 
-    # 存活过滤，顺带进行Finger识别
-    url_list = host_alive(url_list)
 
+def review_pending(Request_Config=None, vuln_probe=None):
+    """
+    逐个审核待审核队列中的域名，并对批准的目标补充验活。
+    """
+    decision_store = get_decision_store(Request_Config.get('domain_decision_file', 'cache/domain_decisions.json'))
+    for domain in list(decision_store.pending):
+        urls = decision_store.pending[domain].get('urls') or []
+        if not urls:
+            # 手动编辑后没有 url 的条目直接清理
+            del decision_store.pending[domain]
+            continue
+        while True:
+            choose = input(f'域名/IP: {domain} (含 {len(urls)} 个 url，例如 {urls[0]}) 是否要进行扫描？[y/N/s(跳过)] ')
+            if choose in ('Y', 'y'):
+                decision_store.set_decision(domain, True)
+                break
+            elif choose in ('N', 'n', ''):
+                decision_store.set_decision(domain, False)
+                break
+            elif choose in ('S', 's'):
+                break
+    return scan_decided(decision_store, [], Request_Config, vuln_probe=vuln_probe)
+
+
+def scan_decided(decision_store, target_groups=None, Request_Config=None, alive_cache=None, vuln_probe=None, verify=True):
+    """
+    把待审核队列中已批准的目标与本轮目标一起验活，并对已批准的目标补做 spring/swagger 探测。
+    已批准的目标验活完成后才从 pending 中移除，中途失败或退出时留待下一轮。
+    """
+    taken = decision_store.take_decided()
+    decision_store.save()
+    target_groups = list(target_groups or []) + taken
+    if not target_groups:
+        if verify:
+            print('没有新批准的目标')
+        return {}
+    try:
+        # 这些目标在所属小程序写报表时尚未批准，探测结果只输出到控制台
+        if vuln_probe is not None and taken:
+            taken_urls = [url for url_list, _ in taken for url in url_list]
+            vuln_results = vuln_probe(taken_urls, alive_cache)
+            print(f"[vuln] 补做探测 {len(taken_urls)} 个延后审核的 url，命中 {len(vuln_results or [])} 条（不写入当前报表）")
+        groups = scan_targets(target_groups, Request_Config, alive_cache) if verify else {}
+    except BaseException:
+        decision_store.release(taken)
+        raise
+    decision_store.finish(taken)
+    decision_store.save()
+    return groups
+
+
+def scan_targets(target_groups=None, Request_Config=None, alive_cache=None):
     task_queue = queue.Queue()
     results_queue = queue.Queue()
     num_threads = Request_Config['request_threads']
     threads = []
-
-    if url_list is None:
-        return None
+    catch_all = CatchAllTracker(Request_Config.get('catch_all_threshold', 5))
+    verify_cache = None
+    if Request_Config.get('cache_active', True):
+        verify_cache = get_verify_cache(Request_Config.get('cache_file', 'cache/verify_cache.json'),
+                                        Request_Config.get('cache_ttl', 86400),
+                                        Request_Config.get('refresh', False))
 
     # 填充任务队列
-    target_list = []
-    for url in url_list:
-        for uri in uri_list:
-            # 根据拼接策略拼接url
-            target = url_target(url, uri)
-            if target not in target_list:
-                target_list.append(target)
-                task_queue.put(target)
+    target_list = set()
+    for url_list, uri_list in target_groups:
+        # 存活过滤，顺带进行Finger识别
+        url_list = host_alive(url_list, alive_cache)
+        for url in url_list:
+            for uri in uri_list:
+                # 根据拼接策略拼接url
+                target = url_target(url, uri)
+                if target not in target_list:
+                    target_list.add(target)
+                    task_queue.put(target)
 
     # 创建线程池
     for i in range(num_threads):
-        t = threading.Thread(target=req_work, args=(task_queue, results_queue, Request_Config))
+        t = threading.Thread(target=req_work, args=(task_queue, results_queue, Request_Config, catch_all, verify_cache))
         t.start()
         threads.append(t)
 
@@ -105,40 +284,59 @@ def scan_active(url_list=None, uri_list=None, Request_Config=None):
     for t in threads:
         t.join()
 
-    # # 将结果取出并存储到列表中
-    # while not results_queue.empty():
-    #     status_code, http_method, body_length, url = results_queue.get(block=False)
-    #     match_results[reg_rule_name] = match_result
-    return results_queue
+    if verify_cache is not None:
+        verify_cache.save()
+
+    # 按响应指纹分组输出，相同页面只展示一次
+    groups = group_by_fingerprint(results_queue)
+    for (status_code, fingerprint), results in groups.items():
+        print(f"[{status_code}] {fingerprint} 共 {len(results)} 条，例如 {results[0][3]}")
+    return groups
 
 
-def manual_filter(url_list=None):
+def manual_filter(url_list=None, decision_store=None):
     """
-    手动筛选domain
+    手动筛选domain，按可注册域名询问，一次回答覆盖其所有子域名
     :param url_list:
+    :param decision_store: DomainDecisionStore，已有决定的域名不再询问
     :return:
     """
+    if decision_store is None:
+        decision_store = DomainDecisionStore()
     new_url_list = []
-    black_domain = []
-    white_domain = []
     for url in url_list:
-        domain = url.split('/')[2]
-        # 先对比是否在黑白名单中
-        if (domain not in white_domain) and (domain not in black_domain):
-            choose_status = True
-            while choose_status:
+        hostname = extract_hostname(url)
+        decision = decision_store.decide(hostname)
+        if decision is None:
+            domain = registrable_domain(hostname)
+            while True:
                 choose = input(f'域名/IP: {domain} 是否要进行扫描？[y/N] ')
                 if choose == 'Y' or choose == 'y':
-                    white_domain.append(domain)
-                    new_url_list.append(url)
-                    choose_status = False
+                    decision = True
+                    break
                 elif choose == 'N' or choose == 'n' or choose == '':
-                    black_domain.append(domain)
-                    choose_status = False
-        elif domain in white_domain:
+                    decision = False
+                    break
+            decision_store.set_decision(domain, decision)
+        if decision:
             new_url_list.append(url)
-        else:
-            continue
+    return new_url_list
+
+
+def defer_filter(url_list=None, uri_list=None, decision_store=None):
+    """
+    非阻塞的domain筛选：只保留已批准的url，未审核的域名写入待审核队列，等待后续 rv 模式或手动编辑审核文件。
+    """
+    new_url_list = []
+    deferred = set()
+    for url in url_list:
+        decision = decision_store.decide(extract_hostname(url))
+        if decision:
+            new_url_list.append(url)
+        elif decision is None:
+            deferred.add(decision_store.defer(url, uri_list))
+    if deferred:
+        print(f"以下域名待审核，已写入 {decision_store.decision_file}：{', '.join(sorted(deferred))}")
     return new_url_list
 
 
@@ -167,25 +365,22 @@ def filter_list(old_list=None, filter_rule=None):
     return new_list
 
 
-def host_alive(url_list=None):
-    # 筛选出端口存活的Domian或IP
-    alive_host = []
-    disalive_host = []
+def host_alive(url_list=None, alive_cache=None):
+    """
+    筛选出端口存活的Domian或IP
+    :param alive_cache: {(domain, port): bool}，跨调用共用，已探测过的主机不再重复连接
+    """
+    if alive_cache is None:
+        alive_cache = {}
     alive_url_list = []
     for url in url_list:
         domain, port = extract_domain_port(url)
-        if [domain, port] in disalive_host:
-            continue
-        elif [domain, port] in alive_host:
+        if (domain, port) not in alive_cache:
+            # Finger识别
+            #
+            alive_cache[(domain, port)] = tcp_alive(domain, port)
+        if alive_cache[(domain, port)]:
             alive_url_list.append(url)
-        else:
-            if tcp_alive(domain, port):
-                # Finger识别
-                #
-                alive_host.append([domain, port])
-                alive_url_list.append(url)
-            else:
-                disalive_host.append([domain, port])
     return alive_url_list
 
 
@@ -1,5 +1,175 @@
 """
-基础漏洞扫描，spring/swagger
+基础漏洞扫描，spring/swagger 未授权访问探测。
+
 """
+import queue
+import threading
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from model import active_request
+from model.domain_review import extract_hostname, get_decision_store
+
+# 探测规则：同一 finger 的路径按顺序探测，命中任意一条即认为识别成功，跳过该 finger 的剩余路径
+DEFAULT_PROBE_RULES = [
+    {'finger': 'spring', 'path': '/actuator', 'keyword': '_links'},
+    {'finger': 'spring', 'path': '/actuator/env', 'keyword': 'activeProfiles'},
+    {'finger': 'spring', 'path': '/env', 'keyword': 'activeProfiles'},
+    {'finger': 'swagger', 'path': '/v2/api-docs', 'keyword': '"swagger"'},
+    {'finger': 'swagger', 'path': '/v3/api-docs', 'keyword': '"openapi"'},
+    {'finger': 'swagger', 'path': '/swagger-resources', 'keyword': 'swaggerVersion'},
+    {'finger': 'swagger', 'path': '/swagger-ui.html', 'keyword': 'swagger-ui'},
+    {'finger': 'swagger', 'path': '/swagger-ui/index.html', 'keyword': 'swagger-ui'},
+]
+
+
+def scan_vuln(url_list=None, Request_Config=None, Vuln_Scan_Config=None, alive_cache=None):
+    """
+    对存活主机进行 spring/swagger 探测。
+    :param url_list: 扫描结果中的 url
+    :param alive_cache: 与 active_request.host_alive 共用的存活缓存，避免重复 TCP 探测
+    :return: [[base_url, finger, path, status_code, url], ...]
+    """
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    if not url_list:
+        return []
+    url_list = active_request.filter_list(url_list, Request_Config['hostname_filter_rule'])
+    url_list = active_request.filter_list(url_list, Request_Config['ip_filter_rule'])
+
+    # 开启手动筛选时只探测已批准的域名
+    if Request_Config['manual_filter']:
+        decision_store = get_decision_store(Request_Config.get('domain_decision_file', 'cache/domain_decisions.json'))
+        url_list = [url for url in url_list if decision_store.decide(extract_hostname(url))]
+
+    url_list = active_request.host_alive(url_list, alive_cache)
+    base_urls = collect_base_urls(url_list)
+    if not base_urls:
+        return []
+
+    probe_rules = Vuln_Scan_Config.get('probe_rules') or DEFAULT_PROBE_RULES
+    num_threads = min(Vuln_Scan_Config.get('vulscan_threads', 20), len(base_urls))
+    task_queue = queue.Queue()
+    results = []
+    result_lock = threading.Lock()
+    threads = []
+
+    for base_url in base_urls:
+        task_queue.put(base_url)
+
+    # 共用连接池，同一主机的多次探测复用连接
+    session = build_session(Request_Config, num_threads)
+
+    def worker():
+        while True:
+            try:
+                base_url = task_queue.get(block=False)
+            except queue.Empty:
+                break
+            try:
+                hits = probe_base_url(session, base_url, probe_rules, Request_Config)
+                if hits:
+                    with result_lock:
+                        results.extend(hits)
+            except Exception as e:
+                print(f"Caught an exception when probing {base_url}: {e}")
+            finally:
+                task_queue.task_done()
+
+    # 创建线程池
+    for i in range(num_threads):
+        t = threading.Thread(target=worker)
+        t.start()
+        threads.append(t)
+
+    # 阻塞直到所有任务完成
+    task_queue.join()
+
+    # 等待所有线程完成
+    for t in threads:
+        t.join()
+
+    session.close()
+    return results
+
+
+def build_vuln_probe(all_config=None):
+    """
+    :return: 开启 vulscan_active 时返回 vuln_probe(url_list, alive_cache)，否则返回 None
+    """
+    Vuln_Scan_Config = all_config.get('Vuln_Scan_Config') or {}
+    if not Vuln_Scan_Config.get('vulscan_active'):
+        return None
+
+    def vuln_probe(url_list, alive_cache=None):
+        return scan_vuln(url_list, all_config['Request_Config'], Vuln_Scan_Config, alive_cache)
+    return vuln_probe
+
+
+def collect_base_urls(url_list=None):
+    """
+    按主机合并 url，得到需要探测的根路径及一级上下文路径，例如
+    https://a.com/api/user/list -> https://a.com, https://a.com/api
+    """
+    base_urls = []
+    seen = set()
+    for url in url_list:
+        parsed = urlparse(url)
+        if not parsed.hostname:
+            continue
+        root = f"{parsed.scheme}://{parsed.netloc}"
+        candidates = [root]
+        segments = [segment for segment in parsed.path.split('/') if segment]
+        # 路径只有一个文件名时不作为上下文路径
+        if len(segments) > 1 or (segments and '.' not in segments[0]):
+            candidates.append(f"{root}/{segments[0]}")
+        for base_url in candidates:
+            if base_url not in seen:
+                seen.add(base_url)
+                base_urls.append(base_url)
+    return base_urls
+
+
+def build_session(Request_Config=None, pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # 去掉 Connection: close，才能复用连接
+    headers = {k: v for k, v in (Request_Config['headers'] or {}).items() if k.lower() != 'connection'}
+    session.headers.update(headers)
+    session.cookies.update(Request_Config['cookies'] or {})
+    session.verify = Request_Config['verify']
+    session.proxies.update(Request_Config['proxies'] or {})
+    return session
 
 
+def probe_base_url(session, base_url, probe_rules, Request_Config=None):
+    hits = []
+    identified = set()
+    max_body_size = int(Request_Config.get('max_body_size', 512) or 0) * 1024
+    for rule in probe_rules:
+        if rule['finger'] in identified:
+            continue
+        url = base_url + rule['path']
+        try:
+            response = session.get(url,
+                                   allow_redirects=Request_Config['allow_redirects'],
+                                   timeout=Request_Config['timeout'],
+                                   stream=True)
+            try:
+                body, _ = active_request.read_body(response, max_body_size)
+            finally:
+                response.close()
+        except requests.exceptions.ConnectionError:
+            # 主机无法连接，放弃剩余探测
+            break
+        except requests.exceptions.RequestException:
+            continue
+        if response.status_code == 200 and rule['keyword'].encode('utf-8') in body:
+            print(f"[vuln] [{rule['finger']}] {url}")
+            identified.add(rule['finger'])
+            hits.append([base_url, rule['finger'], rule['path'], response.status_code, url])
+    return hits
@@ -1,3 +1,5 @@
+import os
+
 import yaml
 
 
@@ -14,6 +16,76 @@ def load_config(config_yaml_path=None, load_type=None):
             return False
 
 
+# 热加载时必须存在的配置项，缺失时保留旧配置，避免监控进程因 KeyError 退出
+REQUIRED_CONFIG_KEYS = {
+    'File_Config': ['WX_Applet_Path', 'Sleep_Time', 'Applet_Packet_Save_Path', 'Excel_Folder',
+                    'Black_Suffix_list', 'White_Suffix_list'],
+    'Regex_Config': ['Url_regex', 'Uri_regex'],
+    'Request_Config': ['request_active', 'request_threads', 'hostname_filter_rule', 'ip_filter_rule',
+                       'uri_filter_rule', 'manual_filter', 'http_methods', 'headers', 'cookies', 'params',
+                       'json', 'allow_redirects', 'timeout', 'verify', 'proxies'],
+}
+
+
+def missing_config_keys(all_config):
+    """
+    :return: 缺失或类型不对的配置项列表，例如 ['Request_Config', 'File_Config.Sleep_Time']
+    """
+    if not isinstance(all_config, dict):
+        return list(REQUIRED_CONFIG_KEYS)
+    missing = []
+    for section, keys in REQUIRED_CONFIG_KEYS.items():
+        section_config = all_config.get(section)
+        if not isinstance(section_config, dict):
+            missing.append(section)
+            continue
+        missing.extend(f"{section}.{key}" for key in keys if key not in section_config)
+    return missing
+
+
+class ConfigWatcher:
+    """
+    轮询配置文件及外部规则文件的修改时间，供 mf 模式热加载配置。
+    """
+
+    def __init__(self, config_yaml_path=None):
+        self.config_yaml_path = config_yaml_path
+        self.config = load_config(config_yaml_path)
+        self.mtimes = self.snapshot()
+
+    def watched_files(self):
+        files = [self.config_yaml_path]
+        rules_file = (self.config.get('Regex_Config') or {}).get('Additional_Secret_Rules_File')
+        if rules_file:
+            files.append(rules_file)
+        return files
+
+    def snapshot(self):
+        return {path: os.path.getmtime(path) if os.path.exists(path) else None for path in self.watched_files()}
+
+    def reload(self):
+        """
+        文件有变化时重新加载，返回新配置；没有变化或加载失败返回 None，继续使用旧配置。
+        """
+        current = self.snapshot()
+        if current == self.mtimes:
+            return None
+        self.mtimes = current
+        try:
+            new_config = load_config(self.config_yaml_path)
+        except Exception as e:
+            print(f"重新加载配置文件失败 {self.config_yaml_path}: {e}")
+            return None
+        missing = missing_config_keys(new_config)
+        if missing:
+            print(f"配置文件缺少 {', '.join(missing)}，继续使用旧配置")
+            return None
+        self.config = new_config
+        # 规则文件路径可能随配置改变
+        self.mtimes = self.snapshot()
+        return new_config
+
+
 if __name__ == '__main__':
     # 加载配置文件，并且设置为全局参数
     config_yaml = r'../config/config.yaml'
@@ -0,0 +1,288 @@
+"""
+域名审核结果的持久化存储：允许/拒绝的决定跨运行保存，未审核的域名进入待审核队列，不阻塞验活流程。
+
+"""
+import ipaddress
+import json
+import os
+import threading
+from urllib.parse import urlparse
+
+from model.verify_cache import write_json_atomic
+
+# 常见的二级公共后缀，遇到时可注册域名取三段
+SECOND_LEVEL_SUFFIXES = {
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn', 'ac.cn',
+    'com.hk', 'com.tw', 'co.uk', 'org.uk', 'co.jp', 'com.au', 'co.kr', 'com.sg',
+}
+
+# 多租户共享的云存储/托管域名，子域名分属不同租户，审核时使用完整主机名，避免一次批准覆盖整个云厂商
+SHARED_HOST_SUFFIXES = {
+    # 腾讯云（COS、云开发、SCF）
+    'myqcloud.com', 'tencentcos.cn', 'tencentcloudapi.com', 'tcloudbaseapp.com', 'tcloudbase.com', 'qcloud.la',
+    # 阿里云（OSS、函数计算等）
+    'aliyuncs.com', 'alicloudapi.com', 'aliyun-inc.com',
+    # 华为云、百度云、七牛、金山云、火山引擎
+    'myhuaweicloud.com', 'huaweicloud.com', 'bcebos.com', 'bcehost.com', 'clouddn.com', 'qiniucs.com',
+    'qnssl.com', 'ksyuncs.com', 'volces.com', 'volcengineapi.com',
+    # 海外云及静态托管
+    'amazonaws.com', 'cloudfront.net', 'core.windows.net', 'azurewebsites.net', 'cloudapp.net',
+    'appspot.com', 'firebaseapp.com', 'web.app', 'cloudfunctions.net', 'run.app',
+    'github.io', 'gitee.io', 'vercel.app', 'netlify.app', 'pages.dev', 'workers.dev', 'herokuapp.com',
+    'sinaapp.com', 'ngrok.io', 'ngrok-free.app',
+}
+
+
+def extract_hostname(url=''):
+    return (urlparse(url).hostname or '').lower()
+
+
+def is_shared_host(hostname=''):
+    labels = hostname.lower().rstrip('.').split('.')
+    return any('.'.join(labels[i:]) in SHARED_HOST_SUFFIXES for i in range(1, len(labels)))
+
+
+def registrable_domain(hostname=''):
+    """
+    取可注册域名，例如 api.a.example.com.cn -> example.com.cn；IP 原样返回。
+    共享托管域名（如 bucket.cos.ap-guangzhou.myqcloud.com）返回完整主机名。
+    """
+    hostname = hostname.lower().rstrip('.')
+    try:
+        ipaddress.ip_address(hostname)
+        return hostname
+    except ValueError:
+        pass
+    if is_shared_host(hostname):
+        return hostname
+    labels = hostname.split('.')
+    if len(labels) >= 3 and '.'.join(labels[-2:]) in SECOND_LEVEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+class DomainDecisionStore:
+    """
+    文件格式：
+    {
+        "allowed": ["example.com"],
+        "disallowed": ["qq.com"],
+        "pending": {"foo.com": {"urls": [...], "uris": [...]}}
+    }
+    allowed/disallowed 按后缀匹配，example.com 的决定同时覆盖其所有子域名；直接编辑文件即可完成审核。
+    """
+
+    def __init__(self, decision_file=''):
+        self.decision_file = decision_file
+        self.lock = threading.Lock()
+        self.allowed = set()
+        self.disallowed = set()
+        self.pending = {}
+        # 已取出、正在验活的 url，只保存在内存中
+        self.in_flight = set()
+        self.mtime = None
+        self.base_decisions = {}
+        self.base_pending_urls = set()
+        self.load()
+
+    def load(self):
+        data = self.read_file()
+        if data is None:
+            return
+        self.allowed = set(data.get('allowed', []))
+        self.disallowed = set(data.get('disallowed', []))
+        self.pending = data.get('pending', {}) or {}
+        self.mark_base()
+
+    def read_file(self):
+        """
+        :return: 文件内容，文件不存在或读取失败返回 None
+        """
+        if not self.decision_file or not os.path.exists(self.decision_file):
+            return None
+        try:
+            mtime = os.path.getmtime(self.decision_file)
+            with open(self.decision_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.mtime = mtime
+            return data if isinstance(data, dict) else None
+        except Exception as e:
+            print(f"加载域名审核文件失败 {self.decision_file}: {e}")
+            return None
+
+    def decisions(self):
+        decisions = {domain: False for domain in self.disallowed}
+        decisions.update({domain: True for domain in self.allowed})
+        return decisions
+
+    def pending_urls(self):
+        return {(domain, url) for domain, entry in self.pending.items() for url in entry.get('urls') or []}
+
+    def mark_base(self):
+        # 记录与文件一致时的状态，合并时据此区分本进程的修改和文件上的修改
+        self.base_decisions = self.decisions()
+        self.base_pending_urls = self.pending_urls()
+
+    def merge_file(self):
+        """
+        三方合并文件上的修改（手动编辑、其他进程的 rv 审核）与本进程的修改，调用方需持有锁。
+        同一域名两边都改过时以本进程为准；pending 按 url 合并。
+        """
+        data = self.read_file()
+        if data is None:
+            return
+        file_decisions = {domain: False for domain in data.get('disallowed', [])}
+        file_decisions.update({domain: True for domain in data.get('allowed', [])})
+        merged = dict(file_decisions)
+        memory_decisions = self.decisions()
+        for domain in set(memory_decisions) | set(self.base_decisions):
+            if memory_decisions.get(domain) != self.base_decisions.get(domain):
+                if domain in memory_decisions:
+                    merged[domain] = memory_decisions[domain]
+                else:
+                    merged.pop(domain, None)
+        self.allowed = {domain for domain, allowed in merged.items() if allowed}
+        self.disallowed = {domain for domain, allowed in merged.items() if not allowed}
+
+        file_pending = data.get('pending', {}) or {}
+        file_urls = {(domain, url) for domain, entry in file_pending.items() for url in entry.get('urls') or []}
+        memory_urls = self.pending_urls()
+        merged_urls = (file_urls | (memory_urls - self.base_pending_urls)) - (self.base_pending_urls - memory_urls)
+        pending = {}
+        for domain, url in sorted(merged_urls):
+            entry = pending.setdefault(domain, {'urls': [], 'uris': []})
+            entry['urls'].append(url)
+        for domain, entry in pending.items():
+            uris = list((self.pending.get(domain) or {}).get('uris') or [])
+            known_uris = set(uris)
+            uris.extend(uri for uri in (file_pending.get(domain) or {}).get('uris') or [] if uri not in known_uris)
+            entry['uris'] = uris
+        self.pending = pending
+        self.mark_base()
+
+    def reload_if_changed(self):
+        """
+        审核文件被手动编辑过时合并文件上的修改。
+        """
+        if not self.decision_file or not os.path.exists(self.decision_file):
+            return
+        with self.lock:
+            if os.path.getmtime(self.decision_file) != self.mtime:
+                self.merge_file()
+
+    def save(self):
+        """
+        先合并文件上的修改再写回，验活期间手动编辑或其他进程做出的审核不会被覆盖。
+        """
+        if not self.decision_file:
+            return
+        with self.lock:
+            self.merge_file()
+            data = {
+                'allowed': sorted(self.allowed),
+                'disallowed': sorted(self.disallowed),
+                'pending': self.pending,
+            }
+            try:
+                write_json_atomic(self.decision_file, data, indent=2)
+                self.mtime = os.path.getmtime(self.decision_file)
+                self.mark_base()
+            except OSError as e:
+                print(f"保存域名审核文件失败 {self.decision_file}: {e}")
+
+    def decide(self, hostname=''):
+        """
+        :return: True 允许，False 拒绝，None 尚未审核。最长后缀优先，便于对单个子域名单独设置。
+        """
+        labels = hostname.lower().split('.')
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.allowed:
+                return True
+            if suffix in self.disallowed:
+                return False
+        return None
+
+    def set_decision(self, domain, allowed):
+        with self.lock:
+            self.allowed.discard(domain)
+            self.disallowed.discard(domain)
+            (self.allowed if allowed else self.disallowed).add(domain)
+
+    def defer(self, url, uri_list=None):
+        """
+        将未审核域名的 url 及其 uri 列表加入待审核队列。
+        """
+        domain = registrable_domain(extract_hostname(url))
+        with self.lock:
+            entry = self.pending.setdefault(domain, {'urls': [], 'uris': []})
+            if url not in entry['urls']:
+                entry['urls'].append(url)
+            known_uris = set(entry['uris'])
+            entry['uris'].extend(uri for uri in uri_list or [] if uri not in known_uris)
+        return domain
+
+    def take_decided(self):
+        """
+        取出已批准的待审核目标用于验活，被拒绝的直接丢弃，仍未审核的继续保留。
+        已批准的目标在 finish() 之前仍留在 pending 中，验活中途退出下次还能继续；
+        取出期间标记为进行中，避免并发时被重复取出。
+        :return: [(url_list, uri_list), ...]
+        """
+        approved = []
+        with self.lock:
+            for domain in list(self.pending):
+                entry = self.pending[domain]
+                approved_urls = []
+                kept_urls = []
+                for url in entry['urls']:
+                    decision = self.decide(extract_hostname(url))
+                    if decision is False:
+                        continue
+                    kept_urls.append(url)
+                    if decision and url not in self.in_flight:
+                        approved_urls.append(url)
+                if approved_urls:
+                    self.in_flight.update(approved_urls)
+                    approved.append((approved_urls, entry['uris']))
+                if kept_urls:
+                    entry['urls'] = kept_urls
+                else:
+                    del self.pending[domain]
+        return approved
+
+    def finish(self, taken):
+        """
+        验活完成后，把 take_decided() 取出的目标从 pending 中移除。
+        """
+        done_urls = {url for url_list, _ in taken for url in url_list}
+        with self.lock:
+            self.in_flight.difference_update(done_urls)
+            for domain in list(self.pending):
+                entry = self.pending[domain]
+                entry['urls'] = [url for url in entry['urls'] if url not in done_urls]
+                if not entry['urls']:
+                    del self.pending[domain]
+
+    def release(self, taken):
+        """
+        验活失败时撤销进行中标记，目标留在 pending 中等待下一轮。
+        """
+        with self.lock:
+            self.in_flight.difference_update(url for url_list, _ in taken for url in url_list)
+
+
+_shared_stores = {}
+_shared_lock = threading.Lock()
+
+
+def get_decision_store(decision_file=''):
+    """
+    同一进程内按审核文件共用一个 DomainDecisionStore，并发任务的延后/批准不会互相覆盖。
+    """
+    with _shared_lock:
+        store = _shared_stores.get(decision_file)
+        if store is None:
+            store = _shared_stores[decision_file] = DomainDecisionStore(decision_file)
+    store.reload_if_changed()
+    return store
@@ -0,0 +1,189 @@
+"""
+扫描结果的批量校验与打分：香农熵、字符类别数、身份证/Luhn 校验位，按规则对整列命中结果向量化计算。
+
+"""
+import re
+from typing import Dict, List
+
+import numpy as np
+
+# 单批最多处理的命中数，避免超长列表一次性展开成过大的矩阵
+BATCH_SIZE = 20000
+# 单条命中最多取前 256 个字符参与计算；.+ 之类的规则可能匹配整行压缩后的 js，不截断时整批都会补齐到最长的那条
+MAX_HIT_WIDTH = 256
+UNICODE_RANGE = 0x110000
+
+# 键值对中的分隔符，取其后的部分作为值：key: value / key = value / key => value / key === value / 密码：value
+VALUE_DELIMITER = re.compile(r'(?:=>|===?|[:=：])\s*')
+# 不加引号的值截到这些字符为止
+VALUE_TOKEN = re.compile(r'[^\s,;)}\]&|]+')
+# 变量、属性访问、函数调用等代码引用，如 this.data.password、res.data.accountId、getToken(
+CODE_REFERENCE = re.compile(r'[A-Za-z_$][\w$]*(?:\.[\w$]+)*\(?')
+CODE_LITERALS = {'true', 'false', 'null', 'undefined', 'None', 'function'}
+
+ID_CARD_WEIGHTS = np.array([7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2])
+ID_CARD_CHECK_CODES = np.array([ord(c) for c in '10X98765432'])
+
+
+def to_code_matrix(hits: List[str], min_width: int = 0):
+    """
+    把字符串列表转成 (n, max_len) 的 Unicode 码点矩阵，不足部分补 0。
+    :return: (codes, lengths)
+    """
+    arr = np.array(hits, dtype=str)
+    width = max(arr.dtype.itemsize // 4, 1)
+    codes = arr.view(np.uint32).reshape(len(hits), width).astype(np.int64)
+    if codes.shape[1] < min_width:
+        codes = np.pad(codes, ((0, 0), (0, min_width - codes.shape[1])))
+    lengths = np.count_nonzero(codes, axis=1)
+    return codes, lengths
+
+
+def shannon_entropy(codes, lengths):
+    """
+    每行字符的香农熵（bit/字符）。
+    """
+    n, width = codes.shape
+    rows = np.repeat(np.arange(n), width)
+    flat = codes.ravel()
+    mask = flat != 0
+    # (行号, 码点) 组合成唯一键，一次 unique 得到每行每个字符的出现次数
+    keys, counts = np.unique(rows[mask] * UNICODE_RANGE + flat[mask], return_counts=True)
+    key_rows = keys // UNICODE_RANGE
+    p = counts / lengths[key_rows]
+    return np.bincount(key_rows, weights=-p * np.log2(p), minlength=n)
+
+
+def charset_classes(codes):
+    """
+    每行包含的字符类别数：小写、大写、数字、其他。
+    """
+    lower = (codes >= ord('a')) & (codes <= ord('z'))
+    upper = (codes >= ord('A')) & (codes <= ord('Z'))
+    digit = (codes >= ord('0')) & (codes <= ord('9'))
+    other = (codes != 0) & ~(lower | upper | digit)
+    return lower.any(1).astype(int) + upper.any(1) + digit.any(1) + other.any(1)
+
+
+def id_card_valid(codes, lengths):
+    """
+    18 位身份证校验位（GB 11643）。
+    """
+    digits = codes[:, :17] - ord('0')
+    valid = (lengths == 18) & ((digits >= 0) & (digits <= 9)).all(1)
+    expected = ID_CARD_CHECK_CODES[(np.clip(digits, 0, 9) * ID_CARD_WEIGHTS).sum(1) % 11]
+    last = codes[:, 17]
+    last = np.where(last == ord('x'), ord('X'), last)
+    return valid & (last == expected)
+
+
+def luhn_valid(codes, lengths):
+    """
+    Luhn 校验（银行卡号等），非纯数字直接判为无效。
+    """
+    mask = codes != 0
+    digits = np.where(mask, codes - ord('0'), 0)
+    valid = (lengths >= 2) & (~mask | ((digits >= 0) & (digits <= 9))).all(1)
+    # 从右往左数的位置，偶数位（从 0 开始计的奇数下标）乘 2
+    position = lengths[:, None] - 1 - np.arange(codes.shape[1])
+    doubled = np.where((position >= 0) & (position % 2 == 1), digits * 2, digits)
+    doubled = np.where(doubled > 9, doubled - 9, doubled)
+    return valid & (doubled.sum(1) % 10 == 0)
+
+
+def extract_value(hit: str):
+    """
+    从 "关键字 + 上下文" 形式的命中中取出赋值部分，引号内的字面量原样返回，
+    代码引用（变量、属性、函数调用）或找不到分隔符时返回空字符串。
+    :return: (value, quoted)，quoted 表示值是引号内的字面量
+    """
+    match = VALUE_DELIMITER.search(hit)
+    if match is None:
+        return '', False
+    rest = hit[match.end():]
+    if not rest:
+        return '', False
+    if rest[0] in '"\'`':
+        end = rest.find(rest[0], 1)
+        return (rest[1:end] if end != -1 else rest[1:]), True
+    token = VALUE_TOKEN.match(rest)
+    if token is None:
+        return '', False
+    value = token.group()
+    if value in CODE_LITERALS or CODE_REFERENCE.fullmatch(value):
+        return '', False
+    return value, False
+
+
+def score_hits(hits: List[str], check: str, min_entropy: float):
+    """
+    对一组命中结果打分，范围 0~1。
+    check 为 id_card / luhn 时按校验位给 0 或 1，为 entropy 时按熵值和字符类别给分，
+    为 value_entropy 时先用 extract_value 取出赋值部分再按熵值打分，引号内的非空字面量直接给满分：
+    password: "123456"、account: "admin" 这类弱口令熵值很低，却正是要找的硬编码凭据。
+    """
+    literal = np.zeros(len(hits), dtype=bool)
+    if check == 'value_entropy':
+        values = [extract_value(hit) for hit in hits]
+        hits = [value for value, _ in values]
+        literal = np.array([quoted and value != '' for value, quoted in values], dtype=bool)
+    scores = np.empty(len(hits))
+    # 按长度排序后分批，同一批的长度相近，减少补 0 的开销
+    order = np.argsort([len(hit) for hit in hits], kind='stable')
+    for start in range(0, len(hits), BATCH_SIZE):
+        batch_index = order[start:start + BATCH_SIZE]
+        batch = [hits[i] for i in batch_index]
+        truncated = np.array([len(hit) > MAX_HIT_WIDTH for hit in batch])
+        codes, lengths = to_code_matrix([hit[:MAX_HIT_WIDTH] for hit in batch], min_width=18)
+        if check == 'id_card':
+            batch_scores = (id_card_valid(codes, lengths) & ~truncated).astype(float)
+        elif check == 'luhn':
+            batch_scores = (luhn_valid(codes, lengths) & ~truncated).astype(float)
+        else:
+            entropy = shannon_entropy(codes, lengths)
+            # 只有一种字符类别的结果（纯数字、纯小写等）减半
+            batch_scores = np.minimum(entropy / min_entropy, 1.0) * np.where(charset_classes(codes) >= 2, 1.0, 0.5)
+        scores[batch_index] = batch_scores
+    scores[literal] = 1.0
+    return scores
+
+
+def rule_check_type(rule_name: str, validation_config: dict):
+    checksum_rules = validation_config.get('checksum_rules') or {}
+    for check, rule_names in checksum_rules.items():
+        if rule_name in (rule_names or []):
+            return check
+    for regex in validation_config.get('value_entropy_rules') or []:
+        if re.fullmatch(regex, rule_name):
+            return 'value_entropy'
+    for regex in validation_config.get('entropy_rules') or []:
+        if re.fullmatch(regex, rule_name):
+            return 'entropy'
+    return None
+
+
+def validate_hits(match_results: Dict[str, List[str]], validation_config: dict) -> Dict[str, List[str]]:
+    """
+    对配置中指定的规则打分：开启 drop_low_confidence 时丢弃低于 min_score 的结果，否则按分数从高到低排序。
+    未配置的规则（url、域名等）原样返回。
+    """
+    min_score = validation_config.get('min_score', 0.5)
+    min_entropy = validation_config.get('min_entropy', 3.0)
+    drop = validation_config.get('drop_low_confidence', False)
+    validated: Dict[str, List[str]] = {}
+    dropped_total = 0
+    for rule_name, hits in match_results.items():
+        check = rule_check_type(rule_name, validation_config)
+        if check is None or not hits:
+            validated[rule_name] = hits
+            continue
+        scores = score_hits([str(hit) for hit in hits], check, min_entropy)
+        if drop:
+            keep = np.flatnonzero(scores >= min_score)
+            dropped_total += len(hits) - len(keep)
+        else:
+            keep = np.argsort(-scores, kind='stable')
+        validated[rule_name] = [hits[i] for i in keep]
+    if dropped_total:
+        print(f"已丢弃 {dropped_total} 条低置信度结果")
+    return validated
@@ -5,12 +5,12 @@ import re
 import threading
 import time
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Set, Tuple
 
 import pandas as pd
 import yaml
 
-from model import active_request
+from model import active_request, base_vuln, hit_validator
 
 
 @dataclass(frozen=True)
@@ -123,7 +123,8 @@ def is_allowed_suffix(filename: str, file_scan_config: dict) -> bool:
     return True
 
 
-def write2excel(match_results: Dict[str, List[str]], Excel_Folder: str, target_folder: Optional[str], additional_rule_names: Set[str]):
+def write2excel(match_results: Dict[str, List[str]], Excel_Folder: str, target_folder: Optional[str], additional_rule_names: Set[str],
+                vuln_results: Optional[List[list]] = None):
     app_name = extract_app_name(target_folder, match_results)
     if app_name:
         excel_name = f"{app_name}_{time.strftime('%Y_%m_%d_%H_%M_%S')}.xlsx"
@@ -144,6 +145,9 @@ def write2excel(match_results: Dict[str, List[str]], Excel_Folder: str, target_f
     # 将数据存储到Excel表格中
     writer = pd.ExcelWriter(excel_file, engine='openpyxl')
     df.to_excel(writer, sheet_name='Sheet1', index=False)
+    if vuln_results:
+        vuln_df = pd.DataFrame(vuln_results, columns=['Base_Url', 'Finger', 'Path', 'Status_Code', 'Url'])
+        vuln_df.to_excel(writer, sheet_name='Vuln_Scan', index=False)
     writer.book.save(excel_file)
 
     print(f'写入成功：{excel_file}')
@@ -204,25 +208,65 @@ def sanitize_results(match_results):
     return {k: clean_item(v) for k, v in match_results.items()}
 
 
-def run_info_finder(target_folder='', all_config=None):
-    rule_set = load_rules(all_config['Regex_Config'])
+def run_info_finder(target_folder='', all_config=None, rule_set: Optional[RuleSet] = None,
+                    progress: Optional[Callable[[str], None]] = None, skip_report: bool = False):
+    """
+    :param progress: 每完成一个阶段回调一次，参数为 scanned / reported / verified
+    :param skip_report: 报表已经写过时跳过写入，只补做验活
+    """
+    def report_progress(stage):
+        if progress is not None:
+            progress(stage)
+
+    if rule_set is None:
+        rule_set = load_rules(all_config['Regex_Config'])
     match_results = scan_files(all_config['File_Config'], rule_set, target_folder)
-    write2excel(match_results, all_config['File_Config']['Excel_Folder'], target_folder, rule_set.additional_rule_names)
-    if all_config['Request_Config']['request_active']:
-        active_request.scan_active(match_results['Url_regex'], match_results['Uri_regex'], all_config['Request_Config'])
+    # 报表和验活之前先对噪声较大的规则打分过滤
+    Hit_Validation_Config = all_config.get('Hit_Validation_Config') or {}
+    if Hit_Validation_Config.get('active'):
+        match_results = hit_validator.validate_hits(match_results, Hit_Validation_Config)
+    report_progress('scanned')
+    # 存活探测结果在漏洞探测和验活之间共用
+    alive_cache = {}
+    vuln_probe = base_vuln.build_vuln_probe(all_config)
+    if not skip_report:
+        vuln_results = None
+        if vuln_probe is not None:
+            vuln_results = vuln_probe(match_results['Url_regex'], alive_cache)
+        write2excel(match_results, all_config['File_Config']['Excel_Folder'], target_folder, rule_set.additional_rule_names, vuln_results)
+    report_progress('reported')
+    request_active = all_config['Request_Config']['request_active']
+    # 未开启验活时也要走一遍，给之前延后审核、现已批准的域名补做探测
+    if request_active or vuln_probe is not None:
+        active_request.scan_active(match_results['Url_regex'], match_results['Uri_regex'], all_config['Request_Config'], alive_cache,
+                                   vuln_probe=vuln_probe, verify=request_active)
+    report_progress('verified')
     return
 
 
-def load_rules(regex_config: dict) -> RuleSet:
+def load_rules(regex_config: dict, previous: Optional[RuleSet] = None, strict: bool = False) -> RuleSet:
     """
     Build and compile regex rules from base and additional sources.
+    Rules whose id and pattern are unchanged from `previous` reuse its compiled regex.
+    With `strict`, a missing or malformed rules file raises instead of being skipped.
     """
-    patterns, additional_names = collect_rule_patterns(regex_config)
-    compiled = {name: re.compile(pattern) for name, pattern in patterns.items()}
+    patterns, additional_names = collect_rule_patterns(regex_config, strict)
+    previous_compiled = previous.compiled if previous is not None else {}
+    compiled: Dict[str, Pattern] = {}
+    recompiled = 0
+    for name, pattern in patterns.items():
+        old = previous_compiled.get(name)
+        if old is not None and old.pattern == pattern:
+            compiled[name] = old
+        else:
+            compiled[name] = re.compile(pattern)
+            recompiled += 1
+    if previous is not None:
+        print(f"规则已更新：重新编译 {recompiled} 条，复用 {len(compiled) - recompiled} 条")
     return RuleSet(compiled=compiled, additional_rule_names=set(additional_names))
 
 
-def collect_rule_patterns(regex_config: dict) -> Tuple[Dict[str, str], List[str]]:
+def collect_rule_patterns(regex_config: dict, strict: bool = False) -> Tuple[Dict[str, str], List[str]]:
     base_rules: Dict[str, str] = {}
     additional_rules: List[dict] = []
     additional_names: List[str] = []
@@ -240,8 +284,19 @@ def collect_rule_patterns(regex_config: dict) -> Tuple[Dict[str, str], List[str]
                 data = yaml.safe_load(f)
             if isinstance(data, dict) and data.get('rules'):
                 additional_rules.extend(data['rules'])
+            elif strict:
+                raise ValueError("缺少 rules 列表")
         except Exception as e:
+            if strict:
+                raise ValueError(f"加载外部规则文件失败 {rules_file}: {e}") from e
             print(f"加载外部规则文件失败 {rules_file}: {e}")
+    elif rules_file and strict:
+        raise ValueError(f"外部规则文件不存在 {rules_file}")
+
+    if strict:
+        invalid = [rule for rule in additional_rules if not isinstance(rule, dict)]
+        if invalid:
+            raise ValueError(f"外部规则格式错误: {invalid[0]!r}")
 
     for rule in additional_rules:
         if not isinstance(rule, dict) or not rule.get('enabled', True):
@@ -0,0 +1,121 @@
+"""
+已处理小程序包的持久化索引（SQLite），记录每个包所处的阶段，监控重启后只补做未完成的部分。
+
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# 处理阶段，按顺序推进；未开启验活时报表写完即标记为 verified
+STAGES = ['detected', 'unpacked', 'scanned', 'reported', 'verified']
+FINAL_STAGE = STAGES[-1]
+
+
+def package_hash(package_folder=''):
+    """
+    计算小程序包目录的内容哈希及版本号（包目录下的子目录名）。
+    :return: (content_hash, version)
+    """
+    sha1 = hashlib.sha1()
+    versions = []
+    for current_path, dirs, files in os.walk(package_folder):
+        dirs.sort()
+        if current_path == package_folder:
+            versions = list(dirs)
+        for file in sorted(files):
+            file_path = os.path.join(current_path, file)
+            sha1.update(os.path.relpath(file_path, package_folder).replace('\\', '/').encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha1.update(chunk)
+    return sha1.hexdigest(), ','.join(versions)
+
+
+class PackageIndex:
+    """
+    packages 表以 (appid, content_hash) 为主键，同一 appid 的新版本内容不同会作为新记录处理。
+    """
+
+    def __init__(self, index_file=''):
+        self.index_file = index_file
+        self.lock = threading.Lock()
+        folder = os.path.dirname(index_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS packages ('
+                'appid TEXT NOT NULL, '
+                'content_hash TEXT NOT NULL, '
+                'version TEXT, '
+                'stage TEXT NOT NULL, '
+                'output_folder TEXT, '
+                'updated_at REAL, '
+                'PRIMARY KEY (appid, content_hash))'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    @contextmanager
+    def connect(self):
+        # 每次操作单独连接并立即提交，进程崩溃也不会丢失已完成的阶段
+        conn = sqlite3.connect(self.index_file, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def is_initialized(self):
+        """
+        是否已经完成过首次启动的登记，目录为空时也能区分首次启动与后续重启。
+        """
+        with self.lock, self.connect() as conn:
+            return conn.execute("SELECT 1 FROM meta WHERE key = 'initialized'").fetchone() is not None
+
+    def mark_initialized(self):
+        with self.lock, self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('initialized', ?)", (str(time.time()),))
+
+    def get(self, appid, content_hash):
+        """
+        :return: {'stage': ..., 'version': ..., 'output_folder': ...}，没有记录返回 None
+        """
+        with self.lock, self.connect() as conn:
+            row = conn.execute(
+                'SELECT stage, version, output_folder FROM packages WHERE appid = ? AND content_hash = ?',
+                (appid, content_hash)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'stage': row[0], 'version': row[1], 'output_folder': row[2]}
+
+    def advance(self, appid, content_hash, stage, version=None, output_folder=None):
+        """
+        推进到指定阶段，阶段只前进不回退；version/output_folder 为 None 时保留原值。
+        """
+        with self.lock, self.connect() as conn:
+            row = conn.execute(
+                'SELECT stage FROM packages WHERE appid = ? AND content_hash = ?',
+                (appid, content_hash)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    'INSERT INTO packages (appid, content_hash, version, stage, output_folder, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (appid, content_hash, version, stage, output_folder, time.time())
+                )
+                return
+            if STAGES.index(stage) < STAGES.index(row[0]):
+                stage = row[0]
+            conn.execute(
+                'UPDATE packages SET stage = ?, '
+                'version = COALESCE(?, version), '
+                'output_folder = COALESCE(?, output_folder), '
+                'updated_at = ? '
+                'WHERE appid = ? AND content_hash = ?',
+                (stage, version, output_folder, time.time(), appid, content_hash)
+            )
@@ -1,19 +1,33 @@
 import json
 import os
+import queue
+import threading
 import time
 import platform
 import subprocess
-import config
-from model import info_finder
+from model import config, info_finder, package_index
 
 
-def monitor_folder(all_config):
+def monitor_folder(all_config, config_path=None):
     File_Config = all_config['File_Config']
     WX_Applet_Path = File_Config['WX_Applet_Path']
 
+    # 热加载：配置或规则文件变化时，在两次任务之间整体替换配置和 RuleSet
+    watcher = config.ConfigWatcher(config_path) if config_path else None
+    rule_set = info_finder.load_rules(all_config['Regex_Config'])
+    index = package_index.PackageIndex(File_Config.get('Package_Index_File', 'cache/package_index.db'))
+
     before = dict([(f, None) for f in os.listdir(WX_Applet_Path)])
     print(before)
 
+    # 首次启动时默认只登记已有的包，不做批量补扫，与旧版本以启动时目录为基线的行为一致
+    if not index.is_initialized():
+        if not File_Config.get('Catch_Up_Existing_On_First_Run', False):
+            seed_index(WX_Applet_Path, list(before), index)
+        index.mark_initialized()
+    # 启动时对照索引，补做停机期间新增或上次未完成的包
+    catch_up(WX_Applet_Path, list(before), all_config, rule_set, index)
+
     while True:
         time.sleep(File_Config['Sleep_Time'])  # 间隔休眠再检查一次
         after = dict([(f, None) for f in os.listdir(WX_Applet_Path)])
@@ -21,15 +35,118 @@ def monitor_folder(all_config):
         if added:
             print("New folder(s) created:", ", ".join(added))
             for son_folder in added:
+                if watcher is not None:
+                    all_config, rule_set = reload_config(watcher, all_config, rule_set)
+                    File_Config = all_config['File_Config']
                 print("等待程序下载...")
                 time.sleep(File_Config['Sleep_Time'])   # 等待程序下载
-                Applet_Packet_Save_Folder = unpacket(WX_Applet_Path, son_folder, File_Config)
-                info_finder.run_info_finder(Applet_Packet_Save_Folder, all_config)
+                process_package(WX_Applet_Path, son_folder, all_config, rule_set, index)
         else:
             print(before)
         before = after
 
 
+def seed_index(WX_Applet_Path, son_folders, index):
+    """
+    把目录中已有的包直接登记为已完成。
+    """
+    print(f"首次启动，登记已有的 {len(son_folders)} 个包为已处理，不进行补扫")
+    for son_folder in son_folders:
+        package_folder = os.path.join(WX_Applet_Path, son_folder)
+        if not os.path.isdir(package_folder):
+            continue
+        content_hash, version = package_index.package_hash(package_folder)
+        index.advance(son_folder, content_hash, package_index.FINAL_STAGE, version=version)
+
+
+def catch_up(WX_Applet_Path, son_folders, all_config, rule_set, index):
+    """
+    多线程补做未完成的包，已完成全部阶段的包直接跳过。
+    """
+    task_queue = queue.Queue()
+    for son_folder in son_folders:
+        if os.path.isdir(os.path.join(WX_Applet_Path, son_folder)):
+            task_queue.put(son_folder)
+    if task_queue.empty():
+        return
+    num_threads = max(1, min(all_config['File_Config'].get('Catch_Up_Threads', 2) or 1, task_queue.qsize()))
+    # 交互式筛选域名时多个线程会同时 input()，只能逐个处理
+    Request_Config = all_config['Request_Config']
+    if Request_Config['manual_filter'] and Request_Config.get('manual_filter_mode', 'defer') == 'interactive':
+        num_threads = 1
+    threads = []
+
+    def worker():
+        while True:
+            try:
+                son_folder = task_queue.get(block=False)
+            except queue.Empty:
+                break
+            try:
+                process_package(WX_Applet_Path, son_folder, all_config, rule_set, index)
+            except Exception as e:
+                print(f"Caught an exception when processing {son_folder}: {e}")
+            finally:
+                task_queue.task_done()
+
+    # 创建线程池
+    for i in range(num_threads):
+        t = threading.Thread(target=worker)
+        t.start()
+        threads.append(t)
+
+    # 阻塞直到所有任务完成
+    task_queue.join()
+
+    # 等待所有线程完成
+    for t in threads:
+        t.join()
+
+
+def process_package(mon_folder, son_folder, all_config, rule_set, index):
+    """
+    根据索引中记录的阶段处理单个包：未解包的先解包，已写报表的只补做验活，已全部完成的跳过。
+    """
+    content_hash, version = package_index.package_hash(os.path.join(mon_folder, son_folder))
+    record = index.get(son_folder, content_hash)
+    stage = record['stage'] if record else None
+    if stage == package_index.FINAL_STAGE:
+        print(f"{son_folder} ({version}) 已处理过，跳过")
+        return
+    if record is None:
+        index.advance(son_folder, content_hash, 'detected', version=version)
+
+    Applet_Packet_Save_Folder = record['output_folder'] if record else None
+    if stage in (None, 'detected') or not (Applet_Packet_Save_Folder and os.path.isdir(Applet_Packet_Save_Folder)):
+        Applet_Packet_Save_Folder = unpacket(mon_folder, son_folder, all_config['File_Config'])
+        index.advance(son_folder, content_hash, 'unpacked', output_folder=Applet_Packet_Save_Folder)
+        stage = 'unpacked'
+
+    info_finder.run_info_finder(Applet_Packet_Save_Folder, all_config, rule_set,
+                                progress=lambda new_stage: index.advance(son_folder, content_hash, new_stage),
+                                skip_report=(stage == 'reported'))
+
+
+def reload_config(watcher, all_config, rule_set):
+    """
+    配置有变化时返回新的 (all_config, rule_set)，只重新编译新增或修改过的规则；
+    加载或编译失败时保留旧的配置和规则。
+    """
+    new_config = watcher.reload()
+    if new_config is None:
+        return all_config, rule_set
+    try:
+        # strict：规则文件读取失败时抛出，而不是只用基础规则静默替换掉全部外部规则
+        new_rule_set = info_finder.load_rules(new_config['Regex_Config'], rule_set, strict=True)
+    except Exception as e:
+        print(f"规则加载或编译失败，继续使用旧配置和规则: {e}")
+        return all_config, rule_set
+    # 命令行参数不在配置文件中，沿用启动时的值
+    new_config['Request_Config']['refresh'] = all_config['Request_Config'].get('refresh', False)
+    print("配置文件已重新加载")
+    return new_config, new_rule_set
+
+
 def build_output_folder(wx_secret, File_Config):
     current_path = os.getcwd()
     target = os.path.join(current_path, File_Config['Applet_Packet_Save_Path'], wx_secret)
@@ -0,0 +1,140 @@
+"""
+验活结果的持久化缓存，跨运行、跨小程序复用 (method, url) 的请求结果。
+
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+
+def normalize_url(url=''):
+    """
+    规范化 url：scheme/host 小写、去掉默认端口和锚点、query 参数排序。
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or '').lower()
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        netloc = f"{netloc}:{port}"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, query, ''))
+
+
+class VerifyCache:
+    """
+    以 "METHOD normalized_url" 为键，保存 [status_code, body_kb, fingerprint, 写入时间]。
+    """
+
+    def __init__(self, cache_file='', ttl=86400, refresh=False):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    @staticmethod
+    def make_key(http_method, url):
+        return f"{http_method.upper()} {normalize_url(url)}"
+
+    def load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"加载验活缓存失败 {self.cache_file}: {e}")
+            self.entries = {}
+
+    def get(self, http_method, url):
+        """
+        :return: 未过期的 [status_code, body_kb, fingerprint]，否则 None
+        """
+        if self.refresh:
+            return None
+        with self.lock:
+            entry = self.entries.get(self.make_key(http_method, url))
+        if entry is None:
+            return None
+        status_code, body_kb, fingerprint, cached_at = entry
+        if self.ttl and time.time() - cached_at > self.ttl:
+            return None
+        return [status_code, body_kb, fingerprint]
+
+    def put(self, http_method, url, status_code, body_kb, fingerprint):
+        with self.lock:
+            self.entries[self.make_key(http_method, url)] = [status_code, body_kb, fingerprint, time.time()]
+            self.dirty = True
+
+    def save(self):
+        """
+        与磁盘上的缓存合并后写回（同一键保留较新的结果），写入失败只打印不抛出，不影响已完成的验活。
+        """
+        if not self.cache_file or not self.dirty:
+            return
+        with self.lock:
+            try:
+                disk_entries = {}
+                if os.path.exists(self.cache_file):
+                    with open(self.cache_file, 'r', encoding='utf-8') as f:
+                        disk_entries = json.load(f)
+                for key, entry in disk_entries.items():
+                    if key not in self.entries or entry[3] > self.entries[key][3]:
+                        self.entries[key] = entry
+            except Exception as e:
+                print(f"读取验活缓存失败，直接覆盖 {self.cache_file}: {e}")
+            # 顺带清理过期条目
+            now = time.time()
+            if self.ttl:
+                self.entries = {k: v for k, v in self.entries.items() if now - v[3] <= self.ttl}
+            try:
+                write_json_atomic(self.cache_file, self.entries)
+                self.dirty = False
+            except OSError as e:
+                print(f"保存验活缓存失败 {self.cache_file}: {e}")
+
+
+def write_json_atomic(file_path, data, **dump_kwargs):
+    """
+    先写入同目录下的唯一临时文件再替换，多个线程/进程同时写也不会互相删掉对方的临时文件。
+    """
+    folder = os.path.dirname(file_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=folder or '.', prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+        os.replace(tmp_file, file_path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def get_verify_cache(cache_file='', ttl=86400, refresh=False):
+    """
+    同一进程内按缓存文件共用一个 VerifyCache，并发的验活任务读写同一份数据。
+    """
+    with _shared_lock:
+        cache = _shared_caches.get(cache_file)
+        if cache is None:
+            cache = _shared_caches[cache_file] = VerifyCache(cache_file, ttl, refresh)
+        else:
+            # 热加载后沿用最新的过期时间和 --refresh
+            cache.ttl = ttl
+            cache.refresh = refresh
+        return cache